@@ -1,17 +1,32 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
-from app.core.database import get_db
+from typing import Optional
+from app.core.database import get_db, get_archive_db
 from app.crud import chat as crud_chat
+from app.crud import archive as crud_archive
+from app.crud import user as crud_user
 from app.schemas import chat as schemas_chat
-from app.api.v1.endpoints.users import get_current_user
+from app.api.v1.endpoints.users import get_current_user, authenticate_token, oauth2_scheme
+from app.core import security
+from app.core.etag import bump_version, get_version, make_etag, is_not_modified, set_etag, not_modified
 from app.models.user import User
 from app.models import chat as models_chat
 from app.api.v1.endpoints.websocket import manager
-import json
 
 router = APIRouter()
 
 
+def bump_chat_room_versions(chat_room_id):
+    """Сообщения комнаты изменились: список комнат отдаёт их вместе с комнатами"""
+    bump_version("chat_rooms")
+    if chat_room_id is not None:
+        bump_version(("chat_room", chat_room_id))
+
+
+def messages_json_response(messages: list) -> Response:
+    return Response(content=crud_chat.message_list_adapter.dump_json(messages), media_type="application/json")
+
+
 @router.post("/messages", response_model=schemas_chat.Message)
 async def send_message(
         message: schemas_chat.MessageCreate,
@@ -28,6 +43,7 @@ async def send_message(
 
     # Создаём сообщение в БД
     db_message = crud_chat.create_message(db=db, message=message, sender_id=current_user.id)
+    bump_chat_room_versions(db_message.chat_room_id)
     
     # Отправляем сообщение через WebSocket всем подключённым пользователям
     ws_payload = {
@@ -45,7 +61,7 @@ async def send_message(
     }
     
     print(f"📤 Broadcasting message via WebSocket: {ws_payload}")
-    await manager.broadcast(json.dumps(ws_payload))
+    await manager.broadcast_room_event(db_message.chat_room_id, ws_payload)
     
     return db_message
 
@@ -54,29 +70,26 @@ async def send_message(
 def get_all_messages(
         skip: int = 0, limit: int = 100,
         current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        db: Session = Depends(get_db),
+        archive_db: Optional[Session] = Depends(get_archive_db)
 ):
-    messages = db.query(models_chat.Message).filter(
-        (models_chat.Message.sender_id == current_user.id) |
-        (models_chat.Message.receiver_id == current_user.id)
-    ).offset(skip).limit(limit).all()
-    
-    # Добавляем sender_name к каждому сообщению
+    # Старые сообщения лежат в архиве и идут перед горячими
     result = []
-    for msg in messages:
-        msg_dict = {
-            "id": msg.id,
-            "content": msg.content,
-            "sender_id": msg.sender_id,
-            "sender_name": msg.sender.username if msg.sender else f"User {msg.sender_id}",
-            "receiver_id": msg.receiver_id,
-            "chat_room_id": msg.chat_room_id,
-            "timestamp": msg.timestamp,
-            "attachments": msg.attachments if msg.attachments else []
-        }
-        result.append(msg_dict)
-    
-    return result
+    hot_skip = skip
+    if archive_db is not None:
+        archived_count = crud_archive.count_archived_messages_for_user(archive_db, current_user.id)
+        if skip < archived_count:
+            archived = crud_archive.get_archived_messages_for_user(archive_db, current_user.id, skip=skip, limit=limit)
+            result.extend(crud_chat.message_row_to_dict(msg) for msg in archived)
+            hot_skip = 0
+        else:
+            hot_skip = skip - archived_count
+
+    if len(result) < limit:
+        rows = crud_chat.get_message_rows_for_user(db, current_user.id, skip=hot_skip, limit=limit - len(result))
+        result.extend(crud_chat.message_row_to_dict(row) for row in rows)
+
+    return messages_json_response(result)
 
 
 @router.post("/chat_rooms", response_model=schemas_chat.ChatRoom)
@@ -86,43 +99,96 @@ def create_chat_room(
         db: Session = Depends(get_db)
 ):
     db_chat_room = crud_chat.create_chat_room(db=db, chat_room=chat_room, creator_id=current_user.id)
+    bump_version("chat_rooms")
     return db_chat_room
 
 
 @router.get("/chat_rooms/{chat_room_id}/messages", response_model=list[schemas_chat.Message])
 def get_chat_room_messages(
         chat_room_id: int,
+        request: Request,
         skip: int = 0, limit: int = 100,
-        current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        before_id: Optional[int] = None,
+        include_senders: bool = False,
+        token: str = Depends(oauth2_scheme),
+        db: Session = Depends(get_db),
+        archive_db: Optional[Session] = Depends(get_archive_db)
 ):
+    """
+    История комнаты по возрастанию id.
+
+    С before_id возвращает limit сообщений перед этим id (курсор для подгрузки вверх),
+    иначе - страницу skip/limit от начала истории. Если горячая таблица закончилась,
+    недостающие сообщения берутся из архива.
+    С include_senders=true к каждому сообщению добавляется sender_profile.
+    """
+    # Подписанного токена достаточно, чтобы ответить 304 без запроса к БД
+    # Каждая страница истории получает свой валидатор
+    page = f"b{before_id}" if before_id is not None else f"s{skip}"
+    if include_senders:
+        etag = make_etag("chat_room", chat_room_id, get_version(("chat_room", chat_room_id)), page, limit, get_version("users"))
+    else:
+        etag = make_etag("chat_room", chat_room_id, get_version(("chat_room", chat_room_id)), page, limit)
+    if is_not_modified(request, etag) and security.decode_access_token(token) is not None:
+        return not_modified(etag, "private, no-cache")
+
+    authenticate_token(token, db)
+    # seq берётся до выборки: всё, что придёт позже, клиент догрузит через resume
+    room_seq = manager.room_sequences.get(chat_room_id, 0)
     chat_room = crud_chat.get_chat_room(db, chat_room_id)
     if not chat_room:
         raise HTTPException(status_code=404, detail="Chat room not found.")
 
     # Здесь можно добавить проверку, состоит ли пользователь в этом чате
-    messages = crud_chat.get_messages_for_chat_room(db, chat_room_id, skip=skip, limit=limit)
-    
-    # Добавляем sender_name к каждому сообщению
-    result = []
-    for msg in messages:
-        msg_dict = {
-            "id": msg.id,
-            "content": msg.content,
-            "sender_id": msg.sender_id,
-            "sender_name": msg.sender.username if msg.sender else f"User {msg.sender_id}",
-            "receiver_id": msg.receiver_id,
-            "chat_room_id": msg.chat_room_id,
-            "timestamp": msg.timestamp,
-            "attachments": msg.attachments if msg.attachments else []
+    if before_id is not None:
+        rows = crud_chat.get_message_rows_for_chat_room_before(db, chat_room_id, before_id, limit=limit)
+        result = [crud_chat.message_row_to_dict(row) for row in rows]
+        if len(result) < limit and archive_db is not None:
+            archive_before_id = rows[-1].id if rows else before_id
+            archived = crud_archive.get_archived_messages_for_chat_room_before(
+                archive_db, chat_room_id, archive_before_id, limit=limit - len(result)
+            )
+            result.extend(crud_chat.message_row_to_dict(msg) for msg in archived)
+        result.reverse()
+    else:
+        result = []
+        hot_skip = skip
+        if archive_db is not None:
+            archived_count = crud_archive.count_archived_messages_for_chat_room(archive_db, chat_room_id)
+            if skip < archived_count:
+                archived = crud_archive.get_archived_messages_for_chat_room(archive_db, chat_room_id, skip=skip, limit=limit)
+                result.extend(crud_chat.message_row_to_dict(msg) for msg in archived)
+                hot_skip = 0
+            else:
+                hot_skip = skip - archived_count
+
+        if len(result) < limit:
+            rows = crud_chat.get_message_rows_for_chat_room(db, chat_room_id, skip=hot_skip, limit=limit - len(result))
+            result.extend(crud_chat.message_row_to_dict(row) for row in rows)
+
+    if include_senders:
+        profiles = crud_user.get_user_profiles(db, [msg["sender_id"] for msg in result])
+        profiles_by_id = {
+            profile["id"]: {"id": profile["id"], "username": profile["username"], "avatar": profile["avatar"]}
+            for profile in profiles
         }
-        result.append(msg_dict)
-    
-    return result
+        for msg in result:
+            msg["sender_profile"] = profiles_by_id.get(msg["sender_id"])
+
+    response = messages_json_response(result)
+    set_etag(response, etag, "private, no-cache")
+    # Точка отсчёта для возобновления WebSocket-сессии (см. ConnectionManager.resume)
+    response.headers["X-Room-Seq"] = str(room_seq)
+    response.headers["X-Ws-Epoch"] = manager.epoch
+    return response
 
 
 @router.get("/chat_rooms", response_model=list[schemas_chat.ChatRoom])
-def get_chat_rooms(db: Session = Depends(get_db)):
+def get_chat_rooms(request: Request, response: Response, db: Session = Depends(get_db)):
+    etag = make_etag("chat_rooms", get_version("chat_rooms"))
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
     return db.query(models_chat.ChatRoom).all()
 
 
@@ -130,9 +196,15 @@ def get_chat_rooms(db: Session = Depends(get_db)):
 async def delete_message(
         message_id: int,
         current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        db: Session = Depends(get_db),
+        archive_db: Optional[Session] = Depends(get_archive_db)
 ):
+    # Сообщение может быть уже перенесено в архив
+    session = db
     message = db.query(models_chat.Message).filter(models_chat.Message.id == message_id).first()
+    if not message and archive_db is not None:
+        session = archive_db
+        message = crud_archive.get_archived_message(archive_db, message_id)
     if not message:
         raise HTTPException(status_code=404, detail="Message not found")
     
@@ -141,8 +213,9 @@ async def delete_message(
         raise HTTPException(status_code=403, detail="Only the author can delete this message")
     
     chat_room_id = message.chat_room_id
-    db.delete(message)
-    db.commit()
+    session.delete(message)
+    session.commit()
+    bump_chat_room_versions(chat_room_id)
     
     # Отправляем уведомление через WebSocket о удалении сообщения
     ws_payload = {
@@ -152,7 +225,7 @@ async def delete_message(
             "chat_room_id": chat_room_id
         }
     }
-    await manager.broadcast(json.dumps(ws_payload))
+    await manager.broadcast_room_event(chat_room_id, ws_payload)
     
     return {"message": "Message deleted successfully"}
 
@@ -161,7 +234,8 @@ async def delete_message(
 def delete_chat_room(
         chat_room_id: int,
         current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        db: Session = Depends(get_db),
+        archive_db: Optional[Session] = Depends(get_archive_db)
 ):
     chat_room = crud_chat.get_chat_room(db, chat_room_id)
     if not chat_room:
@@ -173,4 +247,9 @@ def delete_chat_room(
     
     db.delete(chat_room)
     db.commit()
+    # Горячим сообщениям SQLAlchemy обнуляет chat_room_id сам; архиву - так же,
+    # иначе id комнаты достанется новой комнате вместе со старой историей
+    if archive_db is not None:
+        crud_archive.detach_archived_messages_from_chat_room(archive_db, chat_room_id)
+    bump_chat_room_versions(chat_room_id)
     return {"message": "Chat room deleted successfully"}
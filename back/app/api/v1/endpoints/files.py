@@ -3,6 +3,8 @@ from sqlalchemy.orm import Session
 from app.core.database import get_db
 from app.api.v1.endpoints.users import get_current_user
 from app.models.user import User
+from app.core.etag import bump_version
+from app.crud import user as crud_user
 import os
 import uuid
 from pathlib import Path
@@ -86,6 +88,9 @@ async def upload_avatar(
     current_user.avatar = avatar_url
     db.commit()
     db.refresh(current_user)
+    crud_user.invalidate_user_profile(current_user.id)
+    bump_version(("user", current_user.id))
+    bump_version("users")
     
     return {"avatar_url": avatar_url}
 
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from app.core.database import get_db
@@ -6,6 +6,7 @@ from app.crud import user as crud_user
 from app.schemas import user as schemas_user
 from app.schemas import token as schemas_token
 from app.core import security
+from app.core.etag import get_version, make_etag, is_not_modified, set_etag, not_modified
 from datetime import timedelta
 from app.core.config import settings
 from fastapi.security import OAuth2PasswordBearer
@@ -32,12 +33,17 @@ def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db:
         )
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = security.create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data={"sub": user.username, "uid": user.id}, expires_delta=access_token_expires
     )
     return {"access_token": access_token, "token_type": "bearer", 'user_id': user.id, 'username': user.username}
 
 
 async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    return authenticate_token(token, db)
+
+
+def authenticate_token(token: str, db: Session):
+    """Синхронная проверка токена - для def-эндпоинтов, которые читают токен сами"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -59,16 +65,52 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     return user
 
 
+def user_etag(user_id: int) -> str:
+    return make_etag("user", user_id, get_version(("user", user_id)))
+
+
 @router.get("/me", response_model=schemas_user.User)
-async def get_me(current_user = Depends(get_current_user)):
+async def get_me(
+        request: Request,
+        response: Response,
+        token: str = Depends(oauth2_scheme),
+        db: Session = Depends(get_db)
+):
     """Получить информацию о текущем пользователе"""
+    # uid есть в токене, так что на If-None-Match отвечаем без запроса к БД
+    payload = security.decode_access_token(token)
+    user_id = payload.get("uid") if payload else None
+    if user_id is not None:
+        etag = user_etag(user_id)
+        if is_not_modified(request, etag):
+            return not_modified(etag, "private, no-cache")
+
+    current_user = authenticate_token(token, db)
+    set_etag(response, user_etag(current_user.id), "private, no-cache")
     return current_user
 
 
+@router.get("", response_model=list[schemas_user.User])
+async def get_users(ids: str, db: Session = Depends(get_db)):
+    """Получить профили нескольких пользователей: /users?ids=1,2,3"""
+    try:
+        user_ids = [int(part) for part in ids.split(",") if part.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be a comma-separated list of integers")
+    if len(user_ids) > settings.PROFILE_BATCH_LIMIT:
+        raise HTTPException(status_code=400, detail=f"At most {settings.PROFILE_BATCH_LIMIT} ids per request")
+    return crud_user.get_user_profiles(db, user_ids)
+
+
 @router.get("/{user_id}", response_model=schemas_user.User)
-async def get_user(user_id: int, db: Session = Depends(get_db)):
+async def get_user(user_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
     """Получить информацию о пользователе по ID"""
-    user = crud_user.get_user_by_id(db, user_id=user_id)
-    if not user:
+    etag = user_etag(user_id)
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+
+    profiles = crud_user.get_user_profiles(db, [user_id])
+    if not profiles:
         raise HTTPException(status_code=404, detail="User not found")
-    return user
\ No newline at end of file
+    set_etag(response, etag)
+    return profiles[0]
\ No newline at end of file
@@ -1,5 +1,12 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, Request, Response, WebSocket, WebSocketDisconnect
+from collections import deque
+import asyncio
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.crud import chat as crud_chat
+from app.core.etag import bump_version, get_version, make_etag, is_not_modified, set_etag, not_modified
 import json
+import uuid
 
 router = APIRouter()
 
@@ -14,6 +21,20 @@ class ConnectionManager:
         # Отслеживание пользователей в голосовых каналах
         # {channel_name: [user_id1, user_id2, ...]}
         self.voice_channels = {}
+        # Идентификатор запуска сервера: номера событий живут только в памяти,
+        # после рестарта клиент должен понять, что его seq больше не действителен
+        self.epoch = uuid.uuid4().hex
+        # Последний выданный номер события в комнате {chat_room_id: seq}
+        self.room_sequences = {}
+        # Последние события комнаты {chat_room_id: deque([(seq, message_json), ...])}
+        self.room_event_logs = {}
+        # seq последнего удаления в комнате: догрузка из БД не видит удалённые сообщения
+        self.room_deletion_seqs = {}
+        # Эфемерные события, ожидающие склейки {user_id: [[collapse_key, message_json], ...]}
+        self.pending_events = {}
+        # Отложенные отправки {user_id: asyncio.Task}
+        self.flush_tasks = {}
+        self.coalescing_stats = {"events": 0, "collapsed": 0, "frames": 0}
 
     async def connect(self, websocket: WebSocket, user_id: int):
         await websocket.accept()
@@ -30,11 +51,20 @@ class ConnectionManager:
                 # Удаляем пользователя из словаря, если у него больше нет подключений
                 if not self.active_connections[user_id]:
                     del self.active_connections[user_id]
+                    self.pending_events.pop(user_id, None)
+                    task = self.flush_tasks.pop(user_id, None)
+                    if task:
+                        task.cancel()
             except ValueError:
                 pass
 
     async def send_personal_message(self, message: str, user_id: int):
         """Отправляет сообщение всем подключениям конкретного пользователя"""
+        # Сначала отложенные эфемерные события, чтобы не нарушить порядок
+        await self.flush(user_id)
+        await self._send_to_user(message, user_id)
+
+    async def _send_to_user(self, message: str, user_id: int):
         if user_id in self.active_connections:
             disconnected = []
             for ws in self.active_connections[user_id]:
@@ -53,6 +83,8 @@ class ConnectionManager:
 
     async def broadcast(self, message: str):
         """Отправляет сообщение всем подключениям всех пользователей"""
+        for user_id in list(self.pending_events):
+            await self.flush(user_id)
         disconnected = []
         for user_id, websockets in self.active_connections.items():
             for ws in websockets:
@@ -69,12 +101,187 @@ class ConnectionManager:
             except (ValueError, KeyError):
                 pass
     
+    # ==========================
+    #  Склейка эфемерных событий
+    # ==========================
+    # Сигналинг WebRTC и события присутствия копятся для каждого получателя
+    # WS_COALESCE_WINDOW_MS и уходят одним кадром {"type": "batch", "events": [...]}.
+    # События с одинаковым collapse_key заменяют предыдущие (важно только последнее состояние).
+
+    async def send_ephemeral(self, payload: dict, user_id: int, collapse_key=None):
+        """Эфемерное событие конкретному пользователю"""
+        message = json.dumps(payload)
+        if settings.WS_COALESCE_WINDOW_MS <= 0:
+            await self.send_personal_message(message, user_id)
+            return
+        self._enqueue(user_id, message, collapse_key)
+
+    async def broadcast_ephemeral(self, payload: dict, collapse_key=None):
+        """Эфемерное событие всем пользователям; JSON кодируется один раз"""
+        message = json.dumps(payload)
+        if settings.WS_COALESCE_WINDOW_MS <= 0:
+            await self.broadcast(message)
+            return
+        for user_id in list(self.active_connections):
+            self._enqueue(user_id, message, collapse_key)
+
+    def _enqueue(self, user_id: int, message: str, collapse_key=None):
+        if user_id not in self.active_connections:
+            return
+        events = self.pending_events.setdefault(user_id, [])
+        self.coalescing_stats["events"] += 1
+        if collapse_key is not None:
+            before = len(events)
+            events[:] = [event for event in events if event[0] != collapse_key]
+            self.coalescing_stats["collapsed"] += before - len(events)
+        events.append([collapse_key, message])
+        if user_id not in self.flush_tasks:
+            self.flush_tasks[user_id] = asyncio.create_task(self._flush_later(user_id))
+
+    async def _flush_later(self, user_id: int):
+        await asyncio.sleep(settings.WS_COALESCE_WINDOW_MS / 1000)
+        # События, пришедшие во время отправки, уходят следующим кадром
+        while self.pending_events.get(user_id):
+            await self.flush(user_id)
+        self.flush_tasks.pop(user_id, None)
+
+    async def flush(self, user_id: int):
+        """Немедленно отправляет накопленные эфемерные события пользователя"""
+        events = self.pending_events.pop(user_id, None)
+        if not events:
+            return
+        if len(events) == 1:
+            frame = events[0][1]
+        else:
+            frame = '{"type": "batch", "events": [' + ", ".join(message for _, message in events) + "]}"
+        self.coalescing_stats["frames"] += 1
+        await self._send_to_user(frame, user_id)
+
+    def get_coalescing_stats(self):
+        """Счётчики склейки: сколько событий ушло сколькими кадрами"""
+        stats = dict(self.coalescing_stats)
+        stats["pending"] = sum(len(events) for events in self.pending_events.values())
+        sent = stats["events"] - stats["collapsed"] - stats["pending"]
+        stats["frame_reduction"] = round(1 - stats["frames"] / stats["events"], 3) if stats["events"] else 0.0
+        stats["events_per_frame"] = round(sent / stats["frames"], 2) if stats["frames"] else 0.0
+        return stats
+
+    async def broadcast_room_event(self, chat_room_id, payload: dict):
+        """Нумерует событие комнаты, сохраняет его в журнал и рассылает всем"""
+        if chat_room_id is None:
+            await self.broadcast(json.dumps(payload))
+            return
+
+        seq = self.room_sequences.get(chat_room_id, 0) + 1
+        self.room_sequences[chat_room_id] = seq
+        payload["seq"] = seq
+        payload["epoch"] = self.epoch
+        if payload.get("type") == "message_deleted":
+            self.room_deletion_seqs[chat_room_id] = seq
+        message = json.dumps(payload)
+
+        if chat_room_id not in self.room_event_logs:
+            self.room_event_logs[chat_room_id] = deque(maxlen=settings.WS_REPLAY_LOG_SIZE)
+        self.room_event_logs[chat_room_id].append((seq, message))
+
+        await self.broadcast(message)
+
+    def get_missed_room_events(self, chat_room_id, last_seq: int):
+        """Возвращает пропущенные события комнаты или None, если журнал их уже не содержит"""
+        current_seq = self.room_sequences.get(chat_room_id, 0)
+        if last_seq >= current_seq:
+            return []
+        log = self.room_event_logs.get(chat_room_id)
+        if not log or log[0][0] > last_seq + 1:
+            return None
+        return [message for seq, message in log if seq > last_seq]
+
+    async def resume(self, websocket: WebSocket, data: dict):
+        """
+        Догружает переподключившемуся клиенту пропущенные события.
+
+        Клиент присылает {"epoch": ..., "rooms": {chat_room_id: {"seq": n, "last_message_id": m}}}.
+        Порядок: журнал в памяти -> выборка сообщений с id > last_message_id из БД -> "resync".
+        Выборка из БД не сообщает об удалениях, поэтому используется, только если
+        после seq клиента в комнате ничего не удаляли (в том же epoch).
+        """
+        # Некорректный запрос - пустой resume_ack, а не разрыв соединения
+        data = data if isinstance(data, dict) else {}
+        rooms = data.get("rooms")
+        rooms = rooms if isinstance(rooms, dict) else {}
+        same_epoch = data.get("epoch") == self.epoch
+        result = {}
+
+        for raw_room_id, state in rooms.items():
+            try:
+                chat_room_id = int(raw_room_id)
+            except (TypeError, ValueError):
+                continue
+            state = state if isinstance(state, dict) else {}
+            last_seq = state.get("seq")
+            last_message_id = state.get("last_message_id")
+
+            if not same_epoch or not isinstance(last_seq, int):
+                result[chat_room_id] = {"status": "resync"}
+                continue
+
+            events = self.get_missed_room_events(chat_room_id, last_seq)
+            if events is not None:
+                for message in events:
+                    await websocket.send_text(message)
+                result[chat_room_id] = {"status": "replayed", "count": len(events)}
+                continue
+
+            no_deletions = self.room_deletion_seqs.get(chat_room_id, 0) <= last_seq
+            if isinstance(last_message_id, int) and no_deletions:
+                messages = await asyncio.to_thread(self._load_messages_after, chat_room_id, last_message_id)
+                if messages is not None:
+                    # Клиент заменяет свой хвост истории после last_message_id этим списком
+                    await websocket.send_text(json.dumps({
+                        "type": "resume_messages",
+                        "data": {
+                            "chat_room_id": chat_room_id,
+                            "after_id": last_message_id,
+                            "messages": messages
+                        }
+                    }))
+                    result[chat_room_id] = {"status": "reloaded", "count": len(messages)}
+                    continue
+
+            result[chat_room_id] = {"status": "resync"}
+
+        await websocket.send_text(json.dumps({
+            "type": "resume_ack",
+            "data": {
+                "epoch": self.epoch,
+                "rooms": {
+                    room_id: {**status, "seq": self.room_sequences.get(room_id, 0)}
+                    for room_id, status in result.items()
+                }
+            }
+        }))
+
+    def _load_messages_after(self, chat_room_id: int, after_id: int):
+        """Сообщения комнаты с id > after_id; None, если пропущено слишком много"""
+        limit = settings.WS_REPLAY_DB_LIMIT
+        db = SessionLocal()
+        try:
+            rows = crud_chat.get_message_rows_for_chat_room_after(db, chat_room_id, after_id, limit=limit + 1)
+            if len(rows) > limit:
+                return None
+            return crud_chat.message_list_adapter.dump_python(
+                [crud_chat.message_row_to_dict(row) for row in rows], mode="json"
+            )
+        finally:
+            db.close()
+
     def join_voice_channel(self, user_id: int, channel_name: str):
         """Добавляет пользователя в голосовой канал"""
         if channel_name not in self.voice_channels:
             self.voice_channels[channel_name] = []
         if user_id not in self.voice_channels[channel_name]:
             self.voice_channels[channel_name].append(user_id)
+            bump_version("voice_channels")
             print(f"🎤 User {user_id} joined voice channel '{channel_name}' (total: {len(self.voice_channels[channel_name])})")
     
     def leave_voice_channel(self, user_id: int, channel_name: str):
@@ -82,6 +289,7 @@ class ConnectionManager:
         if channel_name in self.voice_channels:
             if user_id in self.voice_channels[channel_name]:
                 self.voice_channels[channel_name].remove(user_id)
+                bump_version("voice_channels")
                 print(f"🎤 User {user_id} left voice channel '{channel_name}' (remaining: {len(self.voice_channels[channel_name])})")
                 # Удаляем канал если он пустой
                 if not self.voice_channels[channel_name]:
@@ -103,11 +311,21 @@ manager = ConnectionManager()
 #  HTTP эндпоинт для получения списка пользователей в голосовых каналах
 # ==========================
 @router.get("/voice_channels")
-async def get_voice_channels():
+async def get_voice_channels(request: Request, response: Response):
     """Возвращает список всех голосовых каналов с подключенными пользователями"""
+    etag = make_etag("voice_channels", get_version("voice_channels"))
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
     return {"voice_channels": manager.get_all_voice_channels()}
 
 
+@router.get("/coalescing_stats")
+async def get_coalescing_stats():
+    """Счётчики склейки эфемерных событий (events -> frames)"""
+    return manager.get_coalescing_stats()
+
+
 # ==========================
 #  Основной WebSocket эндпоинт
 # ==========================
@@ -128,29 +346,47 @@ async def websocket_endpoint(
                 receiver_id = payload.get("receiver_id")
                 voice_channel_name = payload.get("voice_channel_name")
 
+                # Переподключение: клиент сообщает последние увиденные seq по комнатам
+                if message_type == "resume":
+                    await manager.resume(websocket, payload.get("data"))
+                    continue
+
                 # Обработка событий голосовых каналов
                 if message_type == "voice_channel_join":
                     channel_name = payload.get("data", {}).get("channel_name")
                     join_user_id = payload.get("data", {}).get("user_id")
                     if channel_name and join_user_id:
-                        manager.join_voice_channel(int(join_user_id), channel_name)
-                    await manager.broadcast(json.dumps(payload))
+                        # "3" и 3 - один пользователь, в том числе для ключа склейки
+                        join_user_id = int(join_user_id)
+                        manager.join_voice_channel(join_user_id, channel_name)
+                    await manager.broadcast_ephemeral(payload, collapse_key=("voice", channel_name, join_user_id))
                     continue
                 
                 if message_type == "voice_channel_leave":
                     channel_name = payload.get("data", {}).get("channel_name")
                     leave_user_id = payload.get("data", {}).get("user_id")
                     if channel_name and leave_user_id:
-                        manager.leave_voice_channel(int(leave_user_id), channel_name)
-                    await manager.broadcast(json.dumps(payload))
+                        # "3" и 3 - один пользователь, в том числе для ключа склейки
+                        leave_user_id = int(leave_user_id)
+                        manager.leave_voice_channel(leave_user_id, channel_name)
+                    # Тот же ключ, что у join: склеенные join+leave дают только leave
+                    await manager.broadcast_ephemeral(payload, collapse_key=("voice", channel_name, leave_user_id))
                     continue
                 
                 if message_type == "stop_sharing":
-                    await manager.broadcast(json.dumps(payload))
+                    # Отправитель - тот, чьё это соединение, а не то, что прислал клиент
+                    payload["sender_id"] = user_id
+                    await manager.broadcast_ephemeral(payload, collapse_key=("stop_sharing", user_id))
+                    continue
+
+                # ICE-кандидаты идут пачками: копим, но не склеиваем - нужен каждый
+                if message_type == "candidate" and receiver_id:
+                    payload["sender_id"] = user_id
+                    await manager.send_ephemeral(payload, receiver_id)
                     continue
 
                 # Forward WebRTC signaling to a specific peer
-                if message_type in ("offer", "answer", "candidate") and receiver_id:
+                if message_type in ("offer", "answer") and receiver_id:
                     payload["sender_id"] = user_id
                     await manager.send_personal_message(json.dumps(payload), receiver_id)
                     continue
@@ -158,7 +394,13 @@ async def websocket_endpoint(
                 # Broadcast join signal для голосового канала
                 if message_type == "join" and voice_channel_name:
                     payload["sender_id"] = user_id
-                    await manager.broadcast(json.dumps(payload))
+                    await manager.broadcast_ephemeral(payload, collapse_key=("join", voice_channel_name, user_id))
+                    continue
+
+                # Индикатор набора текста: важно только последнее состояние
+                if message_type == "typing":
+                    payload["sender_id"] = user_id
+                    await manager.broadcast_ephemeral(payload, collapse_key=("typing", user_id, payload.get("chat_room_id")))
                     continue
 
                 # Private chat message
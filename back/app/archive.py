@@ -0,0 +1,113 @@
+"""
+Архивация старых сообщений.
+
+Переносит сообщения старше ARCHIVE_AFTER_DAYS из горячей таблицы messages
+в архивную БД (ARCHIVE_DATABASE_URL). Должна работать внутри сервера:
+её периодически запускает app.main (ARCHIVE_INTERVAL_MINUTES > 0).
+
+Версии для ETag (app/core/etag.py) живут в памяти процесса, и только так
+сервер узнаёт, что сообщения ушли из горячей таблицы. Ручной запуск
+
+    python -m app.archive
+
+предназначен для обслуживания при остановленном API: работающий сервер
+продолжит отвечать 304 на GET /chats/chat_rooms со старым списком сообщений.
+"""
+import asyncio
+from sqlalchemy import func, text
+from app.core.config import settings
+from app.core.database import SessionLocal, ArchiveSessionLocal, ArchiveBase, archive_engine, engine
+from app.core.etag import bump_version
+from app.crud import archive as crud_archive
+from app.models.archive import ArchivedMessage
+from app.models.chat import Message
+
+
+def init_archive_db():
+    if archive_engine is not None:
+        ArchiveBase.metadata.create_all(bind=archive_engine)
+
+
+def ensure_unique_message_ids():
+    """
+    id сообщений должны быть уникальны в горячей таблице и архиве вместе.
+
+    Старая таблица messages в SQLite пересоздаётся с AUTOINCREMENT, а счётчик
+    sqlite_sequence поднимается до максимального id в архиве.
+    """
+    if engine.dialect.name != "sqlite":
+        return
+    with engine.begin() as conn:
+        create_sql = conn.execute(
+            text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'messages'")
+        ).scalar()
+        if create_sql and "AUTOINCREMENT" not in create_sql.upper():
+            print("🗄️ Migrating messages table to AUTOINCREMENT ids")
+            columns = ", ".join(column.name for column in Message.__table__.columns)
+            conn.execute(text("ALTER TABLE messages RENAME TO messages_old"))
+            # Индексы переезжают вместе с таблицей, а имена нужны новой
+            for index in Message.__table__.indexes:
+                conn.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+            Message.__table__.create(conn)
+            conn.execute(text(f"INSERT INTO messages ({columns}) SELECT {columns} FROM messages_old"))
+            conn.execute(text("DROP TABLE messages_old"))
+
+        if ArchiveSessionLocal is None:
+            return
+        archive_db = ArchiveSessionLocal()
+        try:
+            archive_max_id = archive_db.query(func.max(ArchivedMessage.id)).scalar()
+        finally:
+            archive_db.close()
+        if archive_max_id:
+            conn.execute(
+                text("UPDATE sqlite_sequence SET seq = :max_id WHERE name = 'messages' AND seq < :max_id"),
+                {"max_id": archive_max_id}
+            )
+            conn.execute(
+                text("INSERT INTO sqlite_sequence (name, seq) SELECT 'messages', :max_id "
+                     "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'messages')"),
+                {"max_id": archive_max_id}
+            )
+
+
+def run_archive():
+    """Один проход архивации. Возвращает число перенесённых сообщений"""
+    if ArchiveSessionLocal is None:
+        print("🗄️ Archive is disabled: ARCHIVE_DATABASE_URL is not set")
+        return 0
+    db = SessionLocal()
+    archive_db = ArchiveSessionLocal()
+    try:
+        moved = crud_archive.archive_old_messages(
+            db, archive_db,
+            older_than_days=settings.ARCHIVE_AFTER_DAYS,
+            batch_size=settings.ARCHIVE_BATCH_SIZE
+        )
+        if moved:
+            # Список комнат отдаёт сообщения из горячей таблицы
+            bump_version("chat_rooms")
+        print(f"🗄️ Archived {moved} messages older than {settings.ARCHIVE_AFTER_DAYS} days")
+        return moved
+    finally:
+        archive_db.close()
+        db.close()
+
+
+async def archive_loop():
+    """Фоновая задача: архивирует раз в ARCHIVE_INTERVAL_MINUTES"""
+    while True:
+        try:
+            await asyncio.to_thread(run_archive)
+        except Exception as e:
+            print(f"Archive run failed: {e}")
+        # При нескольких воркерах строки мог перенести другой процесс (здесь moved == 0),
+        # поэтому после каждого прохода считаем список комнат изменившимся
+        bump_version("chat_rooms")
+        await asyncio.sleep(settings.ARCHIVE_INTERVAL_MINUTES * 60)
+
+
+if __name__ == "__main__":
+    print("🗄️ Standalone run: restart the API afterwards, its ETags do not see these changes")
+    init_archive_db()
+    run_archive()
@@ -1,3 +1,4 @@
+from typing import Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
@@ -8,5 +9,20 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 43200  # 30 дней
 
+    # Возобновление WebSocket-сессий
+    WS_REPLAY_LOG_SIZE: int = 500  # Сколько последних событий хранить в памяти на каждую комнату
+    WS_REPLAY_DB_LIMIT: int = 200  # Максимум сообщений, догружаемых из БД при переподключении
+    WS_COALESCE_WINDOW_MS: int = 20  # Окно склейки эфемерных событий в один кадр; 0 - отправлять сразу
+
+    # Архив старых сообщений (отдельная БД); без ARCHIVE_DATABASE_URL архивация выключена
+    ARCHIVE_DATABASE_URL: Optional[str] = None
+    ARCHIVE_AFTER_DAYS: int = 30  # Сообщения старше этого возраста переносятся в архив
+    ARCHIVE_BATCH_SIZE: int = 1000
+    ARCHIVE_INTERVAL_MINUTES: int = 60  # Период фонового запуска; 0 - только вручную (python -m app.archive)
+
+    # Кеш профилей пользователей в памяти процесса
+    PROFILE_CACHE_SIZE: int = 10000
+    PROFILE_BATCH_LIMIT: int = 200  # Максимум id в одном запросе GET /users?ids=...
+
 # Инициализация настроек
 settings = Settings()
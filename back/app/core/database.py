@@ -9,9 +9,29 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+# Архивная БД для старых сообщений (см. app/archive.py)
+ArchiveBase = declarative_base()
+archive_engine = None
+ArchiveSessionLocal = None
+if settings.ARCHIVE_DATABASE_URL:
+    archive_connect_args = {"check_same_thread": False} if settings.ARCHIVE_DATABASE_URL.startswith("sqlite") else {}
+    archive_engine = create_engine(settings.ARCHIVE_DATABASE_URL, connect_args=archive_connect_args)
+    ArchiveSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=archive_engine)
+
 # Dependency для получения сессии базы данных
 def get_db():
     db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+# Dependency для получения сессии архивной БД (None, если архив не настроен)
+def get_archive_db():
+    if ArchiveSessionLocal is None:
+        yield None
+        return
+    db = ArchiveSessionLocal()
     try:
         yield db
     finally:
@@ -0,0 +1,47 @@
+"""
+Версии данных для условных GET-запросов (ETag / If-None-Match).
+
+Версии хранятся в памяти процесса и увеличиваются при каждом изменении данных,
+поэтому на If-None-Match можно ответить 304 ещё до обращения к БД.
+EPOCH входит в каждый ETag: после рестарта (или в другом воркере) старые ETag не совпадут.
+"""
+import uuid
+from fastapi import Request, Response
+
+EPOCH = uuid.uuid4().hex[:12]
+
+# Ключи: "chat_rooms", ("chat_room", id), ("user", id), "users" (любой профиль), "voice_channels"
+_versions = {}
+
+
+def bump_version(key):
+    _versions[key] = _versions.get(key, 0) + 1
+
+
+def get_version(key) -> int:
+    return _versions.get(key, 0)
+
+
+def make_etag(*parts) -> str:
+    return '"' + "-".join([EPOCH, *(str(part) for part in parts)]) + '"'
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # Слабое сравнение: W/"x" и "x" считаются одинаковыми
+    return etag in (tag.strip().removeprefix("W/") for tag in header.split(","))
+
+
+def set_etag(response: Response, etag: str, cache_control: str = "no-cache"):
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = cache_control
+
+
+def not_modified(etag: str, cache_control: str = "no-cache") -> Response:
+    response = Response(status_code=304)
+    set_etag(response, etag, cache_control)
+    return response
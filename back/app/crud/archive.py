@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta
+from sqlalchemy.orm import Session
+from app.models.archive import ArchivedMessage
+from app.models.chat import Message
+from app.models.user import User
+
+
+def archive_old_messages(db: Session, archive_db: Session, older_than_days: int, batch_size: int = 1000):
+    """Переносит сообщения старше older_than_days из messages в архив. Возвращает число перенесённых"""
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    total = 0
+    while True:
+        batch = db.query(Message, User.username).outerjoin(
+            User, User.id == Message.sender_id
+        ).filter(Message.timestamp < cutoff).order_by(Message.id).limit(batch_size).all()
+        if not batch:
+            break
+
+        for msg, sender_name in batch:
+            # merge: повторный запуск после сбоя между коммитами не падает на дубликатах
+            archive_db.merge(ArchivedMessage(
+                id=msg.id,
+                sender_id=msg.sender_id,
+                sender_name=sender_name,
+                receiver_id=msg.receiver_id,
+                chat_room_id=msg.chat_room_id,
+                content=msg.content,
+                attachments=msg.attachments,
+                timestamp=msg.timestamp
+            ))
+        # Сначала фиксируем архив, и только потом удаляем из горячей таблицы
+        archive_db.commit()
+
+        db.query(Message).filter(Message.id.in_([msg.id for msg, _ in batch])).delete(synchronize_session=False)
+        db.commit()
+        db.expunge_all()
+        total += len(batch)
+    return total
+
+
+def get_archived_message(archive_db: Session, message_id: int):
+    return archive_db.query(ArchivedMessage).filter(ArchivedMessage.id == message_id).first()
+
+
+def detach_archived_messages_from_chat_room(archive_db: Session, chat_room_id: int):
+    archive_db.query(ArchivedMessage).filter(
+        ArchivedMessage.chat_room_id == chat_room_id
+    ).update({ArchivedMessage.chat_room_id: None}, synchronize_session=False)
+    archive_db.commit()
+
+
+def count_archived_messages_for_chat_room(archive_db: Session, chat_room_id: int):
+    return archive_db.query(ArchivedMessage).filter(ArchivedMessage.chat_room_id == chat_room_id).count()
+
+
+def get_archived_messages_for_chat_room(archive_db: Session, chat_room_id: int, skip: int = 0, limit: int = 100):
+    return archive_db.query(ArchivedMessage).filter(
+        ArchivedMessage.chat_room_id == chat_room_id
+    ).order_by(ArchivedMessage.id).offset(skip).limit(limit).all()
+
+
+def get_archived_messages_for_chat_room_before(archive_db: Session, chat_room_id: int, before_id: int, limit: int = 100):
+    """Последние limit архивных сообщений комнаты с id < before_id, по убыванию id"""
+    return archive_db.query(ArchivedMessage).filter(
+        ArchivedMessage.chat_room_id == chat_room_id,
+        ArchivedMessage.id < before_id
+    ).order_by(ArchivedMessage.id.desc()).limit(limit).all()
+
+
+def _user_filter(user_id: int):
+    return (ArchivedMessage.sender_id == user_id) | (ArchivedMessage.receiver_id == user_id)
+
+
+def count_archived_messages_for_user(archive_db: Session, user_id: int):
+    return archive_db.query(ArchivedMessage).filter(_user_filter(user_id)).count()
+
+
+def get_archived_messages_for_user(archive_db: Session, user_id: int, skip: int = 0, limit: int = 100):
+    return archive_db.query(ArchivedMessage).filter(
+        _user_filter(user_id)
+    ).order_by(ArchivedMessage.id).offset(skip).limit(limit).all()
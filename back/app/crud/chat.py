@@ -1,6 +1,8 @@
 from sqlalchemy.orm import Session
+from pydantic import TypeAdapter
 from app.models.chat import Message, ChatRoom
-from app.schemas.chat import MessageCreate, ChatRoomCreate
+from app.models.user import User
+from app.schemas.chat import MessageCreate, ChatRoomCreate, MessageRow
 
 def get_messages(db: Session, skip: int = 0, limit: int = 100):
     return db.query(Message).offset(skip).limit(limit).all()
@@ -23,4 +25,64 @@ def create_chat_room(db: Session, chat_room: ChatRoomCreate, creator_id: int = N
     return db_chat_room
 
 def get_messages_for_chat_room(db: Session, chat_room_id: int, skip: int = 0, limit: int = 100):
-    return db.query(Message).filter(Message.chat_room_id == chat_room_id).offset(skip).limit(limit).all()
\ No newline at end of file
+    return db.query(Message).filter(Message.chat_room_id == chat_room_id).order_by(Message.id).offset(skip).limit(limit).all()
+
+def message_rows_query(db: Session):
+    """Только колонки для выдачи и имя отправителя одним JOIN - без ORM-объектов и ленивых загрузок"""
+    return db.query(
+        Message.id,
+        Message.content,
+        Message.sender_id,
+        User.username.label("sender_name"),
+        Message.receiver_id,
+        Message.chat_room_id,
+        Message.timestamp,
+        Message.attachments
+    ).outerjoin(User, User.id == Message.sender_id)
+
+
+def message_row_to_dict(row):
+    """Строка из message_rows_query или ArchivedMessage -> dict для MessageRow"""
+    return {
+        "id": row.id,
+        "content": row.content,
+        "sender_id": row.sender_id,
+        "sender_name": row.sender_name or f"User {row.sender_id}",
+        "receiver_id": row.receiver_id,
+        "chat_room_id": row.chat_room_id,
+        "timestamp": row.timestamp,
+        "attachments": row.attachments if row.attachments else [],
+        "sender_profile": None
+    }
+
+
+# Схема собирается один раз; списки сообщений сериализуются сразу в JSON,
+# минуя повторную валидацию через response_model
+message_list_adapter = TypeAdapter(list[MessageRow])
+
+
+def get_message_rows_for_chat_room(db: Session, chat_room_id: int, skip: int = 0, limit: int = 100):
+    return message_rows_query(db).filter(
+        Message.chat_room_id == chat_room_id
+    ).order_by(Message.id).offset(skip).limit(limit).all()
+
+
+def get_message_rows_for_chat_room_after(db: Session, chat_room_id: int, after_id: int, limit: int = 100):
+    return message_rows_query(db).filter(
+        Message.chat_room_id == chat_room_id,
+        Message.id > after_id
+    ).order_by(Message.id).limit(limit).all()
+
+
+def get_message_rows_for_chat_room_before(db: Session, chat_room_id: int, before_id: int, limit: int = 100):
+    """Последние limit сообщений комнаты с id < before_id, по убыванию id"""
+    return message_rows_query(db).filter(
+        Message.chat_room_id == chat_room_id,
+        Message.id < before_id
+    ).order_by(Message.id.desc()).limit(limit).all()
+
+
+def get_message_rows_for_user(db: Session, user_id: int, skip: int = 0, limit: int = 100):
+    return message_rows_query(db).filter(
+        (Message.sender_id == user_id) | (Message.receiver_id == user_id)
+    ).order_by(Message.id).offset(skip).limit(limit).all()
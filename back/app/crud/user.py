@@ -1,7 +1,17 @@
+import threading
+from collections import OrderedDict
 from sqlalchemy.orm import Session
 from app.models.user import User
-from app.schemas.user import UserCreate
+from app.schemas.user import UserCreate, User as UserSchema
 from app.core.security import get_password_hash
+from app.core.config import settings
+
+# LRU-кеш профилей {user_id: dict}; сбрасывается через invalidate_user_profile
+_profile_cache = OrderedDict()
+# Кеш трогают и эндпоинты в event loop, и sync-эндпоинты в threadpool
+_profile_cache_lock = threading.Lock()
+# Счётчик инвалидаций {user_id: n}: профиль, прочитанный до invalidate, в кеш не пишем
+_profile_generations = {}
 
 def get_user(db: Session, user_id: int):
     return db.query(User).filter(User.id == user_id).first()
@@ -18,4 +28,40 @@ def create_user(db: Session, user: UserCreate):
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
-    return db_user
\ No newline at end of file
+    return db_user
+
+
+def get_user_profiles(db: Session, user_ids):
+    """Профили пользователей в порядке user_ids; недостающие догружаются одним IN-запросом"""
+    user_ids = list(dict.fromkeys(user_ids))
+    profiles = {}
+    missing = []
+    with _profile_cache_lock:
+        for user_id in user_ids:
+            profile = _profile_cache.get(user_id)
+            if profile is None:
+                missing.append(user_id)
+            else:
+                _profile_cache.move_to_end(user_id)
+                profiles[user_id] = profile
+        generations = {user_id: _profile_generations.get(user_id, 0) for user_id in missing}
+
+    if missing:
+        # Только колонки профиля: User грузит sent/received_messages через joined-загрузку
+        rows = db.query(User.id, User.username, User.is_active, User.avatar).filter(User.id.in_(missing)).all()
+        with _profile_cache_lock:
+            for row in rows:
+                profile = UserSchema.model_validate(row).model_dump()
+                profiles[row.id] = profile
+                if _profile_generations.get(row.id, 0) == generations[row.id]:
+                    _profile_cache[row.id] = profile
+            while len(_profile_cache) > settings.PROFILE_CACHE_SIZE:
+                _profile_cache.popitem(last=False)
+
+    return [profiles[user_id] for user_id in user_ids if user_id in profiles]
+
+
+def invalidate_user_profile(user_id: int):
+    with _profile_cache_lock:
+        _profile_cache.pop(user_id, None)
+        _profile_generations[user_id] = _profile_generations.get(user_id, 0) + 1
@@ -1,16 +1,37 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from app.api.v1.routes import api_router
 from app.core.database import Base, engine # Импортируем для создания таблиц
 from app.api.v1.endpoints import websocket
+from app.models.chat import Message
+from app.core.config import settings
+from app.archive import init_archive_db, ensure_unique_message_ids, archive_loop
 # Создаем все таблицы в базе данных (если они еще не созданы)
 Base.metadata.create_all(bind=engine)
+# create_all не добавляет новые индексы в уже существующие таблицы
+for index in Message.__table__.indexes:
+    index.create(bind=engine, checkfirst=True)
+init_archive_db()
+ensure_unique_message_ids()
 from fastapi.middleware.cors import CORSMiddleware
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    archive_task = None
+    if settings.ARCHIVE_DATABASE_URL and settings.ARCHIVE_INTERVAL_MINUTES > 0:
+        archive_task = asyncio.create_task(archive_loop())
+    yield
+    if archive_task:
+        archive_task.cancel()
+
+
 app = FastAPI(
     title="FastAPI Messenger",
     description="A messenger application built with FastAPI",
     version="0.1.0",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -19,6 +40,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Room-Seq", "X-Ws-Epoch"],
 )
 
 app.include_router(api_router, prefix="/api/v1")
@@ -0,0 +1,21 @@
+from sqlalchemy import Column, Integer, String, DateTime, JSON, Index
+from app.core.database import ArchiveBase
+
+class ArchivedMessage(ArchiveBase):
+    """Сообщение, перенесённое из горячей таблицы messages в архивную БД"""
+    __tablename__ = "archived_messages"
+
+    # id сохраняется из messages, чтобы курсоры истории продолжали работать
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    sender_id = Column(Integer)
+    # Архив живёт в отдельной БД без таблицы users, поэтому имя отправителя сохраняем при переносе
+    sender_name = Column(String, nullable=True)
+    receiver_id = Column(Integer, nullable=True)
+    chat_room_id = Column(Integer, nullable=True)
+    content = Column(String)
+    attachments = Column(JSON, nullable=True)
+    timestamp = Column(DateTime(timezone=True))
+
+    __table_args__ = (
+        Index("ix_archived_messages_chat_room_id_id", "chat_room_id", "id"),
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, JSON, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.core.database import Base
@@ -18,6 +18,13 @@ class Message(Base):
     receiver = relationship("User", foreign_keys=[receiver_id], back_populates="received_messages")
     chat_room = relationship("ChatRoom", back_populates="messages")
 
+    __table_args__ = (
+        # Выборка диапазона id внутри комнаты (история, догрузка пропущенных сообщений)
+        Index("ix_messages_chat_room_id_id", "chat_room_id", "id"),
+        # Без AUTOINCREMENT SQLite выдаёт max(id)+1 и после архивации повторяет id из архива
+        {"sqlite_autoincrement": True},
+    )
+
 
 class ChatRoom(Base):
     __tablename__ = "chat_rooms"
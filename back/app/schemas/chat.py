@@ -1,6 +1,8 @@
 from pydantic import BaseModel
 from datetime import datetime
 from typing import Optional, List, Dict, Any
+from typing_extensions import TypedDict
+from app.schemas.user import UserProfile
 
 class MessageBase(BaseModel):
     content: str
@@ -18,10 +20,23 @@ class Message(MessageBase):
     receiver_id: Optional[int] = None
     chat_room_id: Optional[int] = None
     attachments: Optional[List[Dict[str, Any]]] = None
+    sender_profile: Optional[UserProfile] = None  # Только при include_senders=true
 
     class Config:
         from_attributes = True
 
+class MessageRow(TypedDict):
+    """Сообщение для быстрой сериализации списков (те же поля, что у Message, без валидации)"""
+    id: int
+    content: str
+    sender_id: int
+    sender_name: Optional[str]
+    timestamp: datetime
+    receiver_id: Optional[int]
+    chat_room_id: Optional[int]
+    attachments: Optional[List[Dict[str, Any]]]
+    sender_profile: Optional[Dict[str, Any]]  # Поля UserProfile
+
 class ChatRoomBase(BaseModel):
     name: str
 
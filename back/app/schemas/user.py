@@ -16,4 +16,10 @@ class UserInDB(UserBase):
         from_attributes = True
 
 class User(UserInDB):
-    pass
\ No newline at end of file
+    pass
+
+class UserProfile(BaseModel):
+    """Компактный профиль отправителя для встраивания в сообщения"""
+    id: int
+    username: str
+    avatar: Optional[str] = None
@@ -0,0 +1,97 @@
+"""
+Сравнение выдачи страницы истории (100 сообщений): старый путь через ORM
+и response_model против выборки колонок с сериализацией через TypeAdapter.
+
+Запуск из папки back:
+
+    python -m benchmarks.bench_message_listing
+"""
+import os
+import tempfile
+import time
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+os.environ.setdefault("SECRET_KEY", "bench")
+
+from pydantic import TypeAdapter
+from app.core.database import Base, engine, SessionLocal
+from app.models.user import User
+from app.models.chat import Message, ChatRoom
+from app.schemas import chat as schemas_chat
+from app.crud import chat as crud_chat
+from app.crud.chat import message_row_to_dict
+from app.api.v1.endpoints.chats import messages_json_response
+
+USERS = 20
+MESSAGES = 5000
+PAGE = 100
+ITERATIONS = 200
+
+# Так FastAPI проверяет и сериализует ответ с response_model=list[Message]
+response_model_adapter = TypeAdapter(list[schemas_chat.Message])
+
+
+def populate():
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    db.add_all([User(username=f"user{i}", hashed_password="x") for i in range(USERS)])
+    db.add(ChatRoom(name="bench"))
+    db.commit()
+    chat_room_id = db.query(ChatRoom).first().id
+    db.add_all([
+        Message(content=f"message {i}", sender_id=i % USERS + 1, chat_room_id=chat_room_id,
+                attachments=[{"name": "a.png", "url": "/media/attachments/a.png"}] if i % 10 == 0 else None)
+        for i in range(MESSAGES)
+    ])
+    db.commit()
+    db.close()
+    return chat_room_id
+
+
+def orm_page(chat_room_id: int, skip: int):
+    db = SessionLocal()
+    try:
+        messages = crud_chat.get_messages_for_chat_room(db, chat_room_id, skip=skip, limit=PAGE)
+        result = []
+        for msg in messages:
+            result.append({
+                "id": msg.id,
+                "content": msg.content,
+                "sender_id": msg.sender_id,
+                "sender_name": msg.sender.username if msg.sender else f"User {msg.sender_id}",
+                "receiver_id": msg.receiver_id,
+                "chat_room_id": msg.chat_room_id,
+                "timestamp": msg.timestamp,
+                "attachments": msg.attachments if msg.attachments else []
+            })
+        return response_model_adapter.dump_json(response_model_adapter.validate_python(result))
+    finally:
+        db.close()
+
+
+def rows_page(chat_room_id: int, skip: int):
+    db = SessionLocal()
+    try:
+        rows = crud_chat.get_message_rows_for_chat_room(db, chat_room_id, skip=skip, limit=PAGE)
+        return messages_json_response([message_row_to_dict(row) for row in rows]).body
+    finally:
+        db.close()
+
+
+def bench(name, func, chat_room_id):
+    func(chat_room_id, 0)  # прогрев
+    start = time.perf_counter()
+    for i in range(ITERATIONS):
+        func(chat_room_id, (i * PAGE) % (MESSAGES - PAGE))
+    elapsed = (time.perf_counter() - start) / ITERATIONS * 1000
+    print(f"{name:<28} {elapsed:8.2f} ms/page")
+    return elapsed
+
+
+if __name__ == "__main__":
+    chat_room_id = populate()
+    print(f"{MESSAGES} messages, {USERS} users, {PAGE} messages per page, {ITERATIONS} pages\n")
+    orm = bench("ORM + response_model", orm_page, chat_room_id)
+    rows = bench("columns + TypeAdapter", rows_page, chat_room_id)
+    print(f"\nspeedup: x{orm / rows:.1f}")
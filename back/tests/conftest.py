@@ -0,0 +1,9 @@
+import os
+import tempfile
+
+# Настройки и движки БД создаются при импорте app, поэтому окружение задаём до него
+_tmp_dir = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp_dir, 'test.db')}"
+os.environ["ARCHIVE_DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp_dir, 'archive.db')}"
+os.environ["ARCHIVE_INTERVAL_MINUTES"] = "0"
+os.environ.setdefault("SECRET_KEY", "test")
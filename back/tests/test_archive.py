@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta
+from fastapi.testclient import TestClient
+from app.main import app
+from app.archive import run_archive
+from app.core.database import SessionLocal
+from app.models.chat import Message
+
+client = TestClient(app)
+
+
+def auth_headers(username: str):
+    client.post("/api/v1/users/register", json={"username": username, "password": "p"})
+    token = client.post("/api/v1/users/token", data={"username": username, "password": "p"}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def age_messages(chat_room_id: int, days: int = 60):
+    db = SessionLocal()
+    for msg in db.query(Message).filter(Message.chat_room_id == chat_room_id):
+        msg.timestamp = datetime.utcnow() - timedelta(days=days)
+    db.commit()
+    db.close()
+
+
+def test_ids_stay_unique_after_whole_hot_table_is_archived():
+    headers = auth_headers("archive_user")
+    room_id = client.post("/api/v1/chats/chat_rooms", json={"name": "archive_room"}, headers=headers).json()["id"]
+    sent = [
+        client.post("/api/v1/chats/messages", json={"content": f"m{i}", "chat_room_id": room_id}, headers=headers).json()
+        for i in range(3)
+    ]
+    age_messages(room_id)
+
+    assert run_archive() >= 3
+    db = SessionLocal()
+    assert db.query(Message).count() == 0
+    db.close()
+
+    new = client.post("/api/v1/chats/messages", json={"content": "new", "chat_room_id": room_id}, headers=headers).json()
+    assert new["id"] > max(msg["id"] for msg in sent)
+
+    history = client.get(f"/api/v1/chats/chat_rooms/{room_id}/messages", headers=headers).json()
+    assert [msg["content"] for msg in history] == ["m0", "m1", "m2", "new"]
+    assert len({msg["id"] for msg in history}) == 4
+
+    before = client.get(f"/api/v1/chats/chat_rooms/{room_id}/messages?before_id={sent[1]['id']}", headers=headers).json()
+    assert [msg["content"] for msg in before] == ["m0"]
+
+    assert client.delete(f"/api/v1/chats/messages/{sent[0]['id']}", headers=headers).status_code == 200
+    history = client.get(f"/api/v1/chats/chat_rooms/{room_id}/messages", headers=headers).json()
+    assert [msg["content"] for msg in history] == ["m1", "m2", "new"]
+
+
+def test_deleted_room_id_does_not_inherit_archived_history():
+    headers = auth_headers("archive_room_owner")
+    room_id = client.post("/api/v1/chats/chat_rooms", json={"name": "doomed_room"}, headers=headers).json()["id"]
+    for i in range(3):
+        client.post("/api/v1/chats/messages", json={"content": f"old{i}", "chat_room_id": room_id}, headers=headers)
+    age_messages(room_id)
+    run_archive()
+
+    assert client.delete(f"/api/v1/chats/chat_rooms/{room_id}", headers=headers).status_code == 200
+    new_room_id = client.post("/api/v1/chats/chat_rooms", json={"name": "fresh_room"}, headers=headers).json()["id"]
+    assert new_room_id == room_id
+
+    history = client.get(f"/api/v1/chats/chat_rooms/{new_room_id}/messages", headers=headers).json()
+    assert history == []
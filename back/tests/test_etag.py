@@ -0,0 +1,20 @@
+from fastapi.testclient import TestClient
+from app.main import app
+
+client = TestClient(app)
+
+
+def test_history_pages_get_distinct_etags():
+    client.post("/api/v1/users/register", json={"username": "etag_user", "password": "p"})
+    token = client.post("/api/v1/users/token", data={"username": "etag_user", "password": "p"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    room_id = client.post("/api/v1/chats/chat_rooms", json={"name": "etag_room"}, headers=headers).json()["id"]
+    for i in range(3):
+        client.post("/api/v1/chats/messages", json={"content": f"m{i}", "chat_room_id": room_id}, headers=headers)
+
+    url = f"/api/v1/chats/chat_rooms/{room_id}/messages"
+    etag = client.get(f"{url}?skip=0", headers=headers).headers["etag"]
+    assert client.get(f"{url}?skip=0", headers={**headers, "If-None-Match": etag}).status_code == 304
+    assert client.get(f"{url}?skip=1", headers={**headers, "If-None-Match": etag}).status_code == 200
+    assert client.get(f"{url}?skip=0&limit=1", headers={**headers, "If-None-Match": etag}).status_code == 200
+    assert client.get(f"{url}?before_id=3", headers={**headers, "If-None-Match": etag}).status_code == 200
@@ -0,0 +1,31 @@
+from app.core.database import SessionLocal
+from app.crud import user as crud_user
+from app.schemas.user import UserCreate
+
+
+class InvalidatingSession:
+    """Сессия, в которую «во время» чтения профилей вклинивается upload_avatar"""
+
+    def __init__(self, db, user_id):
+        self.db = db
+        self.user_id = user_id
+
+    def query(self, *args):
+        crud_user.invalidate_user_profile(self.user_id)
+        return self.db.query(*args)
+
+
+def test_profile_read_racing_with_invalidation_is_not_cached():
+    db = SessionLocal()
+    try:
+        user = crud_user.create_user(db, UserCreate(username="cache_race_user", password="p"))
+        crud_user.invalidate_user_profile(user.id)
+
+        profiles = crud_user.get_user_profiles(InvalidatingSession(db, user.id), [user.id])
+        assert [profile["id"] for profile in profiles] == [user.id]
+        assert user.id not in crud_user._profile_cache
+
+        crud_user.get_user_profiles(db, [user.id])
+        assert user.id in crud_user._profile_cache
+    finally:
+        db.close()
@@ -0,0 +1,63 @@
+from fastapi.testclient import TestClient
+from app.main import app
+from app.core.config import settings
+
+
+def stats(client):
+    return client.get("/ws/coalescing_stats").json()
+
+
+def wait_connected(*sockets):
+    # Пустой resume - гарантия, что соединение уже зарегистрировано
+    for ws in sockets:
+        ws.send_json({"type": "resume", "data": {}})
+        assert ws.receive_json()["type"] == "resume_ack"
+
+
+def test_candidates_are_sent_as_one_batch_before_offer():
+    # Общий event loop для всех соединений, иначе отложенная отправка не сработает
+    with TestClient(app) as client, \
+            client.websocket_connect("/ws/101") as sender, \
+            client.websocket_connect("/ws/102") as receiver:
+        wait_connected(sender, receiver)
+        before = stats(client)
+
+        for i in range(3):
+            sender.send_json({"type": "candidate", "receiver_id": 102, "candidate": f"c{i}"})
+        sender.send_json({"type": "offer", "receiver_id": 102, "sdp": "o"})
+
+        batch = receiver.receive_json()
+        assert batch["type"] == "batch"
+        assert [event["candidate"] for event in batch["events"]] == ["c0", "c1", "c2"]
+        assert all(event["sender_id"] == 101 for event in batch["events"])
+        assert receiver.receive_json()["type"] == "offer"
+
+        after = stats(client)
+        assert after["events"] - before["events"] == 3
+        assert after["collapsed"] - before["collapsed"] == 0
+        assert after["frames"] - before["frames"] == 1
+
+
+def test_voice_join_then_leave_collapses_to_leave(monkeypatch):
+    # Окно побольше, чтобы join и leave точно попали в один кадр
+    monkeypatch.setattr(settings, "WS_COALESCE_WINDOW_MS", 200)
+    with TestClient(app) as client, \
+            client.websocket_connect("/ws/201") as sender, \
+            client.websocket_connect("/ws/202") as receiver:
+        wait_connected(sender, receiver)
+        before = stats(client)
+
+        data = {"channel_name": "coalesce", "user_id": "201"}
+        sender.send_json({"type": "voice_channel_join", "data": data})
+        sender.send_json({"type": "voice_channel_leave", "data": data})
+
+        for ws in (receiver, sender):
+            frame = ws.receive_json()
+            assert frame["type"] == "voice_channel_leave"
+
+        after = stats(client)
+        # По событию join и leave каждому из двух подключённых, join склеен
+        assert after["events"] - before["events"] == 4
+        assert after["collapsed"] - before["collapsed"] == 2
+        assert after["frames"] - before["frames"] == 2
+        assert after["pending"] == 0
@@ -0,0 +1,77 @@
+from fastapi.testclient import TestClient
+from app.main import app
+from app.core.config import settings
+from app.api.v1.endpoints.websocket import manager
+
+client = TestClient(app)
+
+
+def auth_headers(username: str):
+    client.post("/api/v1/users/register", json={"username": username, "password": "p"})
+    token = client.post("/api/v1/users/token", data={"username": username, "password": "p"}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def post_messages(headers, room_id, count):
+    return [
+        client.post("/api/v1/chats/messages", json={"content": f"m{i}", "chat_room_id": room_id}, headers=headers).json()["id"]
+        for i in range(count)
+    ]
+
+
+def resume(rooms, epoch=None):
+    """Переподключается и возвращает (кадры до resume_ack, resume_ack)"""
+    frames = []
+    with client.websocket_connect("/ws/1") as ws:
+        ws.send_json({"type": "resume", "data": {"epoch": epoch or manager.epoch, "rooms": rooms}})
+        while True:
+            frame = ws.receive_json()
+            if frame["type"] == "resume_ack":
+                return frames, frame["data"]
+            frames.append(frame)
+
+
+def test_malformed_resume_gets_empty_ack():
+    with client.websocket_connect("/ws/1") as ws:
+        for data in ({"rooms": [1, 2]}, [1, 2], "rooms", None):
+            ws.send_json({"type": "resume", "data": data})
+            assert ws.receive_json() == {"type": "resume_ack", "data": {"epoch": manager.epoch, "rooms": {}}}
+
+
+def test_resume_replays_missed_events_from_log():
+    headers = auth_headers("resume_log")
+    room_id = client.post("/api/v1/chats/chat_rooms", json={"name": "resume_log"}, headers=headers).json()["id"]
+    first_id = post_messages(headers, room_id, 1)[0]
+    missed_ids = post_messages(headers, room_id, 2)
+
+    frames, ack = resume({str(room_id): {"seq": 1, "last_message_id": first_id}})
+
+    assert [frame["data"]["id"] for frame in frames] == missed_ids
+    assert [frame["seq"] for frame in frames] == [2, 3]
+    assert ack["rooms"][str(room_id)] == {"status": "replayed", "count": 2, "seq": 3}
+
+
+def test_resume_falls_back_to_db_past_log_size(monkeypatch):
+    monkeypatch.setattr(settings, "WS_REPLAY_LOG_SIZE", 2)
+    headers = auth_headers("resume_db")
+    room_id = client.post("/api/v1/chats/chat_rooms", json={"name": "resume_db"}, headers=headers).json()["id"]
+    first_id = post_messages(headers, room_id, 1)[0]
+    missed_ids = post_messages(headers, room_id, 3)
+
+    frames, ack = resume({str(room_id): {"seq": 1, "last_message_id": first_id}})
+
+    assert len(frames) == 1 and frames[0]["type"] == "resume_messages"
+    assert frames[0]["data"]["after_id"] == first_id
+    assert [message["id"] for message in frames[0]["data"]["messages"]] == missed_ids
+    assert ack["rooms"][str(room_id)] == {"status": "reloaded", "count": 3, "seq": 4}
+
+
+def test_resume_with_other_epoch_requires_resync():
+    headers = auth_headers("resume_epoch")
+    room_id = client.post("/api/v1/chats/chat_rooms", json={"name": "resume_epoch"}, headers=headers).json()["id"]
+    first_id = post_messages(headers, room_id, 2)[0]
+
+    frames, ack = resume({str(room_id): {"seq": 1, "last_message_id": first_id}}, epoch="stale-epoch")
+
+    assert frames == []
+    assert ack["rooms"][str(room_id)] == {"status": "resync", "seq": 2}
@@ -5,7 +5,7 @@ import VoicePanel, { playMessageTone } from './VoicePanel'
 import VoiceChannels from './VoiceChannels'
 import Auth from './Auth'
 import { createWS } from './ws'
-import {apiGet, apiPost, apiDelete} from './api'
+import {apiGet, apiGetWithHeaders, apiPost, apiDelete} from './api'
 import { API_URL } from './config'
 
 export default function App(){
@@ -38,6 +38,9 @@ export default function App(){
   const [currentVoiceChannel, setCurrentVoiceChannel] = useState(null)
   const [connectedUsers, setConnectedUsers] = useState({})
   const rtcRef = useRef(null)
+  const wsRef = useRef(null)
+  // id пользователей, чьи профили уже получены или запрошены
+  const requestedProfilesRef = useRef(new Set())
   const activeRef = useRef(active)
   const currentVoiceChannelRef = useRef(currentVoiceChannel)
 
@@ -45,26 +48,45 @@ export default function App(){
   async function loadMessages(roomId){ 
     if(!roomId) return; 
     try{ 
-      const msgs = await apiGet(`/api/v1/chats/chat_rooms/${roomId}/messages`); 
+      // Профили отправителей приходят вместе с историей - без отдельного запроса на каждого
+      const { data: msgs, headers } = await apiGetWithHeaders(`/api/v1/chats/chat_rooms/${roomId}/messages?include_senders=true`); 
       setMessages(msgs);
-      // Загружаем аватары для всех уникальных пользователей
-      const uniqueUserIds = [...new Set(msgs.map(m => m.sender_id).filter(Boolean))];
-      for(const userId of uniqueUserIds) {
-        if(!userAvatars[userId]) {
-          loadUserAvatar(userId);
-        }
-      }
+      // Запоминаем точку отсчёта, чтобы после переподключения догрузить только пропущенное
+      const seq = headers.get('X-Room-Seq');
+      wsRef.current && wsRef.current.trackRoom && wsRef.current.trackRoom(roomId, {
+        seq: seq != null ? Number(seq) : null,
+        epoch: headers.get('X-Ws-Epoch'),
+        lastMessageId: msgs.reduce((max, m) => Math.max(max, m.id || 0), 0)
+      });
+      rememberProfiles(msgs.map(m => m.sender_profile).filter(Boolean));
+      // Для отправителей без профиля (например, удалённых) - один общий запрос
+      loadUserAvatars(msgs.map(m => m.sender_id));
     }catch(e){ console.error('Load messages error', e); } 
   }
-  
-  async function loadUserAvatar(userId) {
-    try {
-      const user = await apiGet(`/api/v1/users/${userId}`);
-      if(user.avatar) {
-        setUserAvatars(prev => ({...prev, [userId]: API_URL + user.avatar}));
+
+  function rememberProfiles(profiles) {
+    const avatars = {};
+    for(const profile of profiles) {
+      requestedProfilesRef.current.add(profile.id);
+      if(profile.avatar) avatars[profile.id] = API_URL + profile.avatar;
+    }
+    if(Object.keys(avatars).length) setUserAvatars(prev => ({...prev, ...avatars}));
+  }
+
+  // Профили всех ещё не известных отправителей одним запросом /users?ids=...
+  async function loadUserAvatars(userIds) {
+    const ids = [...new Set(userIds.filter(Boolean).map(Number))].filter(id => !requestedProfilesRef.current.has(id));
+    if(!ids.length) return;
+    ids.forEach(id => requestedProfilesRef.current.add(id));
+    // Сервер принимает не больше PROFILE_BATCH_LIMIT (200) id за раз
+    for(let i = 0; i < ids.length; i += 200) {
+      const chunk = ids.slice(i, i + 200);
+      try {
+        rememberProfiles(await apiGet(`/api/v1/users?ids=${chunk.join(',')}`));
+      } catch(e) {
+        chunk.forEach(id => requestedProfilesRef.current.delete(id));
+        console.warn('Failed to load avatars for users', chunk, e);
       }
-    } catch(e) {
-      console.warn('Failed to load avatar for user', userId, e);
     }
   }
 
@@ -110,6 +132,7 @@ export default function App(){
       setConnected(false);
     }); 
     setWs(wsInst); 
+    wsRef.current = wsInst;
     return ()=>{ 
       console.log('Closing WebSocket connection');
       try{ wsInst.closeConn && wsInst.closeConn() }catch(e){} 
@@ -177,22 +200,40 @@ export default function App(){
       return;
     } 
     
+    // Переподключение: сервер прислал сообщения комнаты после after_id - заменяем ими хвост
+    if(data.type === 'resume_messages' && data.data){
+      const { chat_room_id, after_id, messages: missed } = data.data;
+      setMessages(m => [
+        ...m.filter(msg => !(String(msg.chat_room_id) === String(chat_room_id) && msg.id > after_id)),
+        ...(missed || [])
+      ]);
+      loadUserAvatars((missed || []).map(msg => msg.sender_id));
+      return;
+    }
+
+    // Пропуск слишком большой (или сервер перезапускался) - перечитываем открытую комнату целиком
+    if(data.type === 'resume_ack' && data.data){
+      Object.entries(data.data.rooms || {}).forEach(([roomId, st]) => {
+        if(st.status === 'resync' && String(roomId) === String(activeRef.current)) loadMessages(activeRef.current);
+      });
+      return;
+    }
+
     // Проверяем разные форматы сообщений от бэкенда
     if(data.type==='message' && data.data){ 
       const msg = data.data;
       console.log('Message received (type=message, data):', msg);
       
       // Загружаем аватар отправителя, если его еще нет
-      if(msg.sender_id && !userAvatars[msg.sender_id]) {
-        loadUserAvatar(msg.sender_id);
-      }
+      loadUserAvatars([msg.sender_id]);
       
       // Воспроизводим звуковой сигнал для сообщений от других пользователей
       if(msg.sender_id && String(msg.sender_id) !== String(auth?.user_id)) {
         playMessageTone();
       }
       
-      setMessages(m=>[...m,{ 
+      // После resume сообщение может прийти повторно
+      setMessages(m=> msg.id && m.some(x => x.id === msg.id) ? m : [...m,{ 
         id: msg.id||Date.now(), 
         sender_id: msg.sender_id,
         sender_name: msg.sender_name||('User '+(msg.sender_id||'?')),
@@ -210,9 +251,7 @@ export default function App(){
       console.log('Message received (direct format):', data);
       
       // Загружаем аватар отправителя, если его еще нет
-      if(data.sender_id && !userAvatars[data.sender_id]) {
-        loadUserAvatar(data.sender_id);
-      }
+      loadUserAvatars([data.sender_id]);
       
       // Воспроизводим звуковой сигнал для сообщений от других пользователей
       if(data.sender_id && String(data.sender_id) !== String(auth?.user_id)) {
@@ -15,6 +15,16 @@ export async function apiGet(path){
   return res.json()
 }
 
+// То же, что apiGet, но вместе с заголовками ответа
+export async function apiGetWithHeaders(path){
+  const token = localStorage.getItem('token')
+  const headers = {}
+  if(token){ headers['Authorization'] = token.startsWith('Bearer ')? token : `Bearer ${token}` }
+  const res = await fetch(makeUrl(path), { headers })
+  if(!res.ok){ const txt = await res.text(); throw new Error(txt || ('HTTP '+res.status)) }
+  return { data: await res.json(), headers: res.headers }
+}
+
 export async function apiPost(path, body){
   const token = localStorage.getItem('token')
   const headers = {'Content-Type':'application/json'}
@@ -31,9 +31,52 @@ export function createWS(userId, onMessage, onOpen, onClose){
   let shouldReconnect = true;
   let reconnectTimeout = 1000;
 
+  // Состояние для возобновления сессии: события комнат нумеруются сервером (seq),
+  // после переподключения отправляем последние увиденные seq и получаем только пропущенное
+  // {chat_room_id: {seq, last_message_id}}
+  const rooms = {};
+  let epoch = null;
+
+  function roomState(id){ return rooms[id] || (rooms[id] = {}) }
+  function setEpoch(e){
+    // Сервер перезапустился: старые seq больше ничего не значат
+    if(e && e !== epoch){ epoch = e; Object.values(rooms).forEach(r => { delete r.seq }) }
+  }
+  function trackRoom(id, {seq, lastMessageId, epoch: e} = {}){
+    if(id == null) return;
+    setEpoch(e);
+    const r = roomState(id);
+    if(seq != null) r.seq = seq;
+    if(lastMessageId != null) r.last_message_id = lastMessageId;
+  }
+  function track(d){
+    if(!d || typeof d !== 'object' || !d.data) return;
+    if(d.type === 'resume_ack'){
+      setEpoch(d.data.epoch);
+      Object.entries(d.data.rooms || {}).forEach(([id, st]) => { roomState(id).seq = st.seq });
+      return;
+    }
+    if(d.type === 'resume_messages'){
+      const r = roomState(d.data.chat_room_id);
+      (d.data.messages || []).forEach(m => { r.last_message_id = Math.max(r.last_message_id || 0, m.id) });
+      return;
+    }
+    if(d.seq && d.data.chat_room_id != null){
+      setEpoch(d.epoch);
+      const r = roomState(d.data.chat_room_id);
+      r.seq = Math.max(r.seq || 0, d.seq);
+      if(d.type === 'message' && d.data.id) r.last_message_id = Math.max(r.last_message_id || 0, d.data.id);
+    }
+  }
+  function sendResume(socket){
+    if(!Object.keys(rooms).length) return;
+    try{ socket.send(JSON.stringify({ type: 'resume', data: { epoch, rooms } })) }catch(e){ console.error(e) }
+  }
+
   function connect(){
     ws = new WebSocket(url);
-    ws.addEventListener('open', ()=>{ reconnectTimeout = 1000; onOpen && onOpen(); console.log('WS open', url) });
+    const socket = ws;
+    ws.addEventListener('open', ()=>{ reconnectTimeout = 1000; sendResume(socket); onOpen && onOpen(); console.log('WS open', url) });
     ws.addEventListener('message', ev=>{ 
       // console.log('WS raw message:', ev.data); // Можно раскомментить для отладки
       let d = ev.data; 
@@ -43,11 +86,18 @@ export function createWS(userId, onMessage, onOpen, onClose){
       }catch(e){
         console.warn('WS parse error:', e);
       } 
+      // Сервер склеивает эфемерные события (сигналинг, присутствие) в один кадр
+      if(d && d.type === 'batch' && Array.isArray(d.events)){
+        d.events.forEach(ev => { track(ev); onMessage && onMessage(ev) });
+        return;
+      }
+      track(d);
       onMessage && onMessage(d);
     });
     ws.addEventListener('close', ()=>{ onClose && onClose(); if(shouldReconnect){ setTimeout(()=>{ reconnectTimeout = Math.min(30000, reconnectTimeout*1.5); connect() }, reconnectTimeout) } })
     ws.sendJSON = obj => { try{ ws && ws.readyState === WebSocket.OPEN && ws.send(JSON.stringify(obj)) }catch(e){ console.error(e) } }
     ws.closeConn = ()=>{ shouldReconnect=false; try{ ws.close() }catch(e){} }
+    ws.trackRoom = trackRoom
   }
   connect();
   return ws;